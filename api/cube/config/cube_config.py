@@ -1,8 +1,10 @@
 """
 Configuration for the cube-based architecture with kTools integration
 """
-from typing import Dict, Any
+from typing import Dict, Any, Mapping
 from pathlib import Path
+from types import MappingProxyType
+import copy
 
 # Base configuration
 CUBE_CONFIG = {
@@ -14,7 +16,11 @@ CUBE_CONFIG = {
         "training": {
             "batch_size": 32,
             "max_memory_per_node": "100MB",
-            "optimization_level": "memory_efficient"
+            "optimization_level": "memory_efficient",
+            "num_workers": 4,
+            "max_batch_size": 64,
+            "flush_interval_ms": 10,
+            "queue_maxsize": 4096
         }
     },
     "ktools": {
@@ -60,22 +66,54 @@ CUBE_CONFIG = {
         "dependency_management": {
             "auto_resolve": True,
             "max_depth": 5,
-            "cache_ttl": 3600
+            "cache_ttl": 3600,
+            "monitor_interval_s": 30
         }
     }
 }
 
+# Resolved once at import; the file lives at <root>/api/cube/config/
+_ROOT = Path(__file__).resolve().parents[3]
+
 def get_project_root() -> Path:
     """Get the project root directory."""
-    return Path(__file__).parent.parent.parent.parent
+    return _ROOT
 
-def get_config() -> Dict[str, Any]:
-    """Get the configuration with resolved paths."""
-    config = CUBE_CONFIG.copy()
+def _resolve_config() -> Dict[str, Any]:
+    """Build a private deep copy of CUBE_CONFIG with resolved paths."""
+    config = copy.deepcopy(CUBE_CONFIG)
     config["paths"] = {
-        "root": str(get_project_root()),
-        "models": str(get_project_root() / "models"),
-        "cache": str(get_project_root() / "cache"),
-        "logs": str(get_project_root() / "logs")
+        "root": str(_ROOT),
+        "models": str(_ROOT / "models"),
+        "cache": str(_ROOT / "cache"),
+        "logs": str(_ROOT / "logs")
     }
     return config
+
+def _freeze(value: Any) -> Any:
+    """Recursively wrap dicts in read-only views; other values are kept as-is."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    return value
+
+_RESOLVED = _resolve_config()
+# Frozen from its own copy so nothing reachable through get_config() is
+# shared with _RESOLVED, which get_config_copy() copies from
+_FROZEN: Mapping[str, Any] = _freeze(copy.deepcopy(_RESOLVED))
+
+def get_config() -> Mapping[str, Any]:
+    """Get the shared, read-only configuration with resolved paths.
+
+    Every caller receives the same object. It and every nested section are
+    MappingProxyType views rather than dicts, so they cannot be modified,
+    but they also cannot be deep-copied, pickled or passed to json/orjson
+    directly. Lists are left as lists and are shared between callers of
+    get_config(), so they must not be modified either; get_config_copy()
+    is not affected, as it copies from a separate source. Use it for a
+    private, plain-dict copy that can be modified or serialized.
+    """
+    return _FROZEN
+
+def get_config_copy() -> Dict[str, Any]:
+    """Get a private, deep-copied configuration that is safe to modify."""
+    return copy.deepcopy(_RESOLVED)
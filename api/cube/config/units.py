@@ -0,0 +1,26 @@
+"""
+Unit helpers for timing values in the cube configuration
+
+Timing values in the config are in seconds unless they are listed as
+milliseconds here. Millisecond values are keys ending in ``_ms``
+(``flush_interval_ms``), plus ``networking.websocket.retry_delay`` and
+``networking.mesh.sync_interval``, which keep their original unsuffixed
+names. Read millisecond values through ms() and everything else through
+s(); both validate the raw value and normalize it to float seconds, the
+unit asyncio expects.
+"""
+from typing import Union
+
+Number = Union[int, float]
+
+def s(value: Number) -> float:
+    """Validate a duration given in seconds and return it as float seconds."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError(f"Duration must be a number, got {type(value).__name__}")
+    if value < 0:
+        raise ValueError(f"Duration must be non-negative, got {value}")
+    return float(value)
+
+def ms(value: Number) -> float:
+    """Validate a duration given in milliseconds and return it as float seconds."""
+    return s(value) / 1000.0
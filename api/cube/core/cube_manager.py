@@ -1,12 +1,15 @@
 """
 Core manager for the cube-based architecture with kTools integration
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Mapping, Optional, Tuple
+from dataclasses import dataclass
+from types import MappingProxyType
 import asyncio
 import logging
-from datetime import datetime
+import time
 
 from ..config.cube_config import get_config
+from ..config import units
 from ..k_tools import (
     KWebSocket, KWebSocketServer,
     KModel, KQuery,
@@ -15,93 +18,277 @@ from ..k_tools import (
 
 logger = logging.getLogger(__name__)
 
+# (name, role) of each cube node; node IDs are assigned from 1 in this order
+NODE_ROLES: Tuple[Tuple[str, str], ...] = (
+    ("vertex_1", "SCADA"),
+    ("vertex_2", "HMI"),
+    ("vertex_3", "PLC"),
+    ("vertex_4", "HISTORIAN"),
+    ("vertex_5", "GATEWAY"),
+    ("vertex_6", "LOAD_BALANCER"),
+    ("vertex_7", "TRAINING"),
+    ("vertex_8", "MONITORING"),
+    ("central", "COORDINATOR")
+)
+
+def _ts() -> int:
+    """Get the current time as integer milliseconds since the Unix epoch."""
+    return time.time_ns() // 1_000_000
+
+_EMPTY_SECTION: Mapping[str, Any] = MappingProxyType({})
+
+@dataclass(frozen=True)
+class NodeConfig:
+    """Read-only configuration handed to a CubeNode.
+
+    shared is the process-wide config view and is the same object for every
+    node; role_cfg is the optional per-role section from config["roles"].
+    """
+    role_cfg: Mapping[str, Any]
+    shared: Mapping[str, Any]
+
 class CubeManager:
     """Manages the cube-based architecture for SCADA training and dependency management."""
     
     def __init__(self):
         self.config = get_config()
         self.active_nodes: Dict[int, 'CubeNode'] = {}
-        self.training_queue: asyncio.Queue = asyncio.Queue()
+        self.training_queue: asyncio.Queue = asyncio.Queue(
+            maxsize=self.config["architecture"]["training"].get("queue_maxsize", 4096)
+        )
         self.websocket_server: Optional[KWebSocketServer] = None
+        self._workers: List[asyncio.Task] = []
+        self._monitor_task: Optional[asyncio.Task] = None
+        
+        # Bumped whenever nodes or dependency edges change; the topological order is
+        # recomputed only when it differs from the version it was built for
+        self._deps_version = 0
+        self._topo_version = -1
+        self._topo_levels: List[List['CubeNode']] = []
+        
+        training_cfg = self.config["architecture"]["training"]
+        self._num_workers = training_cfg.get("num_workers", 4)
+        self._max_batch_size = training_cfg.get("max_batch_size", 64)
+        self._flush_interval_s = units.ms(training_cfg.get("flush_interval_ms", 10))
+        
+        ws = self.config["networking"]["websocket"]
+        self._ws_kwargs = {
+            "port": ws["standalone_port"],
+            "ping_interval": ws["ping_interval"],
+            "ping_timeout": ws["ping_timeout"]
+        }
+        
+        dep_cfg = self.config["training"]["dependency_management"]
+        self._dep_monitor_interval_s = units.s(dep_cfg.get("monitor_interval_s", 30))
+        if self._dep_monitor_interval_s <= 0:
+            raise ValueError(f"dependency_management.monitor_interval_s must be positive, got {self._dep_monitor_interval_s}")
+        self._dep_max_depth = dep_cfg.get("max_depth", 5)
+        if self._dep_max_depth <= 0:
+            raise ValueError(f"dependency_management.max_depth must be positive, got {self._dep_max_depth}")
         
     async def initialize(self):
         """Initialize the cube manager and its components."""
         try:
             # Initialize websocket server
-            self.websocket_server = KWebSocketServer(
-                port=self.config["networking"]["websocket"]["port"],
-                ping_interval=self.config["networking"]["websocket"]["ping_interval"]
-            )
+            self.websocket_server = KWebSocketServer(**self._ws_kwargs)
             
             # Initialize nodes
             await self._initialize_nodes()
             
             # Start background tasks
-            asyncio.create_task(self._process_training_queue())
-            asyncio.create_task(self._monitor_dependencies())
+            self._workers = [
+                asyncio.create_task(self._worker())
+                for _ in range(self._num_workers)
+            ]
+            self._monitor_task = asyncio.create_task(self._monitor_dependencies())
             
             logger.info("Cube manager initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize cube manager: {e}")
             raise
             
+    async def shutdown(self):
+        """Cancel the training workers and the dependency monitor."""
+        tasks = list(self._workers)
+        if self._monitor_task:
+            tasks.append(self._monitor_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._monitor_task = None
+        logger.info("Cube manager shut down")
+            
     async def _initialize_nodes(self):
         """Initialize the cube nodes with their respective roles."""
-        node_roles = [
-            ("vertex_1", "SCADA"),
-            ("vertex_2", "HMI"),
-            ("vertex_3", "PLC"),
-            ("vertex_4", "HISTORIAN"),
-            ("vertex_5", "GATEWAY"),
-            ("vertex_6", "LOAD_BALANCER"),
-            ("vertex_7", "TRAINING"),
-            ("vertex_8", "MONITORING"),
-            ("central", "COORDINATOR")
-        ]
-        
-        for node_id, (name, role) in enumerate(node_roles, 1):
-            node = CubeNode(
+        roles_cfg = self.config.get("roles", _EMPTY_SECTION)
+        nodes = [
+            CubeNode(
                 node_id=node_id,
                 name=name,
                 role=role,
-                config=self.config
+                config=NodeConfig(
+                    role_cfg=roles_cfg.get(role, _EMPTY_SECTION),
+                    shared=self.config
+                )
             )
-            await node.initialize()
-            self.active_nodes[node_id] = node
+            for node_id, (name, role) in enumerate(NODE_ROLES, 1)
+        ]
+        results = await asyncio.gather(
+            *(node.initialize() for node in nodes),
+            return_exceptions=True
+        )
+        for node, result in zip(nodes, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Node {node.name} ({node.role}) failed to initialize and is not active: {result!r}")
+            else:
+                self.active_nodes[node.node_id] = node
+        self._deps_version += 1
+        
+    def add_dependency(self, node_id: int, depends_on: int):
+        """Record that node_id depends on depends_on; rejects edges that form a cycle."""
+        node = self.active_nodes.get(node_id)
+        if not node:
+            raise ValueError(f"Node {node_id} not found")
+        if depends_on not in self.active_nodes:
+            raise ValueError(f"Node {depends_on} not found")
+        if not node._add_edge(depends_on):
+            return
+        self._deps_version += 1
+        try:
+            self._ensure_topo_order()
+        except ValueError:
+            node._remove_edge(depends_on)
+            self._deps_version += 1
+            raise
+            
+    def remove_dependency(self, node_id: int, depends_on: int):
+        """Remove the edge recording that node_id depends on depends_on, if present."""
+        node = self.active_nodes.get(node_id)
+        if not node:
+            raise ValueError(f"Node {node_id} not found")
+        if node._remove_edge(depends_on):
+            self._deps_version += 1
+            
+    def _ensure_topo_order(self) -> List[List['CubeNode']]:
+        """Get active nodes in dependency order, grouped into levels.
+
+        Every node comes after all of its dependencies and nodes within a
+        level do not depend on each other. The order is cached and only
+        recomputed after nodes or edges change. Raises ValueError on a cycle.
+        """
+        if self._topo_version != self._deps_version:
+            self._topo_levels = self._compute_topo_levels()
+            self._topo_version = self._deps_version
+        return self._topo_levels
+        
+    def _compute_topo_levels(self) -> List[List['CubeNode']]:
+        """Order active nodes with Kahn's algorithm, in O(nodes + edges)."""
+        nodes = self.active_nodes
+        in_degree = {node_id: 0 for node_id in nodes}
+        dependents: Dict[int, List[int]] = {node_id: [] for node_id in nodes}
+        for node_id, node in nodes.items():
+            for dep_id in set(node.dependencies):
+                if dep_id in nodes:
+                    in_degree[node_id] += 1
+                    dependents[dep_id].append(node_id)
+                    
+        levels: List[List['CubeNode']] = []
+        level = [node_id for node_id, degree in in_degree.items() if degree == 0]
+        ordered = 0
+        while level:
+            levels.append([nodes[node_id] for node_id in level])
+            ordered += len(level)
+            next_level = []
+            for node_id in level:
+                for dependent in dependents[node_id]:
+                    in_degree[dependent] -= 1
+                    if in_degree[dependent] == 0:
+                        next_level.append(dependent)
+            level = next_level
             
-    async def _process_training_queue(self):
-        """Process the training queue in the background."""
+        if ordered != len(nodes):
+            cyclic = sorted(node_id for node_id, degree in in_degree.items() if degree > 0)
+            raise ValueError(f"Dependency cycle among nodes {cyclic}")
+        return levels
+            
+    async def _worker(self):
+        """Consume training tasks from the shared queue in batches; one of several workers."""
+        queue = self.training_queue
+        loop = asyncio.get_running_loop()
         while True:
+            # Block for the first item, then collect more until the batch is
+            # full or the flush window has elapsed
+            batch = [await queue.get()]
             try:
-                training_task = await self.training_queue.get()
-                node_id = training_task["node_id"]
-                data = training_task["data"]
-                
-                node = self.active_nodes.get(node_id)
-                if node:
-                    await node.process_training_data(data)
-                
-                self.training_queue.task_done()
+                deadline = loop.time() + self._flush_interval_s
+                while len(batch) < self._max_batch_size:
+                    if not queue.empty():
+                        batch.append(queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._dispatch_batch(batch)
             except Exception as e:
-                logger.error(f"Error processing training task: {e}")
-            await asyncio.sleep(0.1)
+                logger.error(f"Error processing training batch: {e}")
+            finally:
+                for _ in batch:
+                    queue.task_done()
+                    
+    async def _dispatch_batch(self, batch: List[Dict[str, Any]]):
+        """Group a batch of training tasks by node and hand each group to its node."""
+        groups: Dict[int, List[Dict[str, Any]]] = {}
+        for training_task in batch:
+            groups.setdefault(training_task["node_id"], []).append(training_task["data"])
+            
+        pending = []
+        for node_id, items in groups.items():
+            node = self.active_nodes.get(node_id)
+            if node:
+                pending.append((node, node.process_training_data_batch(items)))
+                
+        results = await asyncio.gather(*(coro for _, coro in pending), return_exceptions=True)
+        for (node, _), result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error processing training batch in node {node.name}: {result}")
             
     async def _monitor_dependencies(self):
         """Monitor and manage dependencies between nodes."""
         while True:
             try:
-                for node in self.active_nodes.values():
-                    await node.check_dependencies()
-            except Exception as e:
-                logger.error(f"Error monitoring dependencies: {e}")
-            await asyncio.sleep(self.config["training"]["dependency_management"]["cache_ttl"])
+                levels = self._ensure_topo_order()
+            except ValueError as e:
+                logger.error(f"Error ordering dependencies: {e}")
+                levels = [list(self.active_nodes.values())]
+                
+            # One pass checks each node exactly once, after everything it
+            # depends on; nodes within a level are checked concurrently. Only
+            # the first max_depth levels are checked, so nodes at the end of
+            # longer dependency chains are skipped.
+            if len(levels) > self._dep_max_depth:
+                skipped = [node.name for nodes in levels[self._dep_max_depth:] for node in nodes]
+                logger.debug(f"Dependency chains exceed max_depth {self._dep_max_depth}; skipping {skipped}")
+            for nodes in levels[:self._dep_max_depth]:
+                results = await asyncio.gather(
+                    *(node.check_own_dependencies() for node in nodes),
+                    return_exceptions=True
+                )
+                for node, result in zip(nodes, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"Error monitoring dependencies of node {node.name}: {result}")
+            await asyncio.sleep(self._dep_monitor_interval_s)
             
     async def add_training_data(self, node_id: int, data: Dict[str, Any]):
-        """Add training data to the processing queue."""
+        """Add training data to the processing queue, waiting while it is full."""
         await self.training_queue.put({
             "node_id": node_id,
             "data": data,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _ts()
         })
         
     async def get_node_status(self, node_id: int) -> Dict[str, Any]:
@@ -109,18 +296,48 @@ class CubeManager:
         node = self.active_nodes.get(node_id)
         if not node:
             raise ValueError(f"Node {node_id} not found")
-        return await node.get_status()
+        status = await node.get_status()
+        status["queue_size"] = self.training_queue.qsize()
+        return status
 
 class CubeNode:
     """Represents a node in the cube architecture."""
     
-    def __init__(self, node_id: int, name: str, role: str, config: Dict[str, Any]):
+    # Role -> name of the coroutine method that handles its training data.
+    # Add more role-specific handlers as needed.
+    _HANDLERS: Dict[str, str] = {
+        "TRAINING": "_handle_training_data",
+        "MONITORING": "_handle_monitoring_data",
+    }
+    
+    def __init__(self, node_id: int, name: str, role: str, config: NodeConfig):
         self.node_id = node_id
         self.name = name
         self.role = role
-        self.config = config
-        self.dependencies: List[int] = []
+        self.cfg = config
+        # Edges are owned by CubeManager; change them via add/remove_dependency
+        self._dependencies: Tuple[int, ...] = ()
         self.status = "initializing"
+        self._handler = getattr(self, self._HANDLERS.get(role, "_handle_default"))
+        
+    @property
+    def dependencies(self) -> Tuple[int, ...]:
+        """IDs of the nodes this node depends on (read-only)."""
+        return self._dependencies
+        
+    def _add_edge(self, depends_on: int) -> bool:
+        """Add a dependency edge for CubeManager; returns False if it already exists."""
+        if depends_on in self._dependencies:
+            return False
+        self._dependencies += (depends_on,)
+        return True
+        
+    def _remove_edge(self, depends_on: int) -> bool:
+        """Remove a dependency edge for CubeManager; returns False if it was absent."""
+        if depends_on not in self._dependencies:
+            return False
+        self._dependencies = tuple(dep_id for dep_id in self._dependencies if dep_id != depends_on)
+        return True
         
     async def initialize(self):
         """Initialize the node with its specific role configuration."""
@@ -136,27 +353,73 @@ class CubeNode:
     async def process_training_data(self, data: Dict[str, Any]):
         """Process training data specific to this node's role."""
         try:
-            # Process based on role
-            if self.role == "TRAINING":
-                await self._handle_training_data(data)
-            elif self.role == "MONITORING":
-                await self._handle_monitoring_data(data)
-            # Add more role-specific handlers as needed
+            await self._handler(data)
         except Exception as e:
             logger.error(f"Error processing data in node {self.name}: {e}")
             
-    async def check_dependencies(self):
-        """Check and update dependencies with other nodes."""
+    async def process_training_data_batch(self, batch: List[Dict[str, Any]]):
+        """Process a batch of training data items addressed to this node."""
+        for data in batch:
+            await self.process_training_data(data)
+            
+    async def _handle_training_data(self, data: Dict[str, Any]):
+        """Handle training data on a TRAINING node."""
+        # Implement training logic
+        logger.debug(f"Node {self.name} has no training handler yet; dropping data")
+        
+    async def _handle_monitoring_data(self, data: Dict[str, Any]):
+        """Handle training data on a MONITORING node."""
+        # Implement monitoring logic
+        logger.debug(f"Node {self.name} has no monitoring handler yet; dropping data")
+        
+    async def _handle_default(self, data: Dict[str, Any]):
+        """Handle training data on roles without a dedicated handler."""
+        logger.debug(f"Node {self.name} ({self.role}) has no handler for training data; dropping data")
+        
+    async def check_own_dependencies(self):
+        """Check and update this node's direct dependencies with other nodes."""
         # Implement dependency checking logic
         pass
         
+    async def check_dependencies(
+        self,
+        nodes: Optional[Mapping[int, 'CubeNode']] = None,
+        max_depth: int = 5
+    ):
+        """Check this node and its transitive dependencies, breadth first.
+
+        Level 0 is this node, level 1 its direct dependencies, and so on;
+        dependencies are looked up in nodes and at most max_depth levels are
+        checked. Each node is checked once, at the level where it is first
+        reached, which is its shortest distance from this node.
+        """
+        if max_depth <= 0:
+            raise ValueError(f"max_depth must be positive, got {max_depth}")
+        seen = {self.node_id}
+        frontier = [self]
+        depth = 0
+        while frontier and depth < max_depth:
+            for node in frontier:
+                await node.check_own_dependencies()
+            depth += 1
+            if nodes is None or depth == max_depth:
+                break
+            next_frontier = []
+            for node in frontier:
+                for dep_id in node.dependencies:
+                    dependency = nodes.get(dep_id)
+                    if dependency and dep_id not in seen:
+                        seen.add(dep_id)
+                        next_frontier.append(dependency)
+            frontier = next_frontier
+        
     async def get_status(self) -> Dict[str, Any]:
-        """Get the current status of the node."""
+        """Get a snapshot of the current status of the node."""
         return {
             "node_id": self.node_id,
             "name": self.name,
             "role": self.role,
             "status": self.status,
-            "dependencies": self.dependencies,
-            "timestamp": datetime.utcnow().isoformat()
+            "dependencies": list(self._dependencies),
+            "timestamp": _ts()
         }
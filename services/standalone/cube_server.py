@@ -1,13 +1,14 @@
-from fastapi import FastAPI, WebSocket, HTTPException, Path, Body
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Path, Body
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.openapi.utils import get_openapi
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 import json
 import asyncio
+import orjson
+import time
 from pathlib import Path as FilePath
 from typing import Dict, Set, Optional, List
-from datetime import datetime
 from pydantic import BaseModel, Field
 from sim.services.cube.manager import CubeManager
 from sim.core.database import db
@@ -17,6 +18,34 @@ import ssl
 
 logger = logging.getLogger(__name__)
 
+INDEX_HTML_PATH = FilePath("sim/templates/standalone/cube_server.html")
+
+# WebSocket message type -> name of the StandaloneCubeServer handler method
+MESSAGE_HANDLERS = {
+    "create_cube": "handle_create_cube",
+    "list_cubes": "handle_list_cubes",
+    "peer_discovery": "handle_peer_discovery",
+}
+
+def _ts() -> int:
+    """Get the current time as integer milliseconds since the Unix epoch."""
+    return time.time_ns() // 1_000_000
+
+async def send_fast(websocket: WebSocket, obj) -> None:
+    """Send obj as a binary JSON frame encoded with orjson."""
+    await websocket.send_bytes(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS))
+
+async def recv_fast(websocket: WebSocket):
+    """Receive one JSON message, decoded with orjson.
+
+    Accepts both text and binary frames, so clients may keep sending text.
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    payload = message.get("bytes")
+    return orjson.loads(payload if payload is not None else message["text"])
+
 class CubeConfig(BaseModel):
     """Configuration for cube creation"""
     name: str = Field(..., description="Name of the cube")
@@ -29,7 +58,7 @@ class CubeMessage(BaseModel):
     data: Dict = Field(..., description="Message payload")
 
 class StandaloneCubeServer:
-    def __init__(self):
+    def __init__(self, reload_templates: bool = False):
         self.app = FastAPI(
             title="Standalone Cube Server",
             description="API for managing standalone cubes with WebSocket support",
@@ -39,6 +68,14 @@ class StandaloneCubeServer:
         self.cube_manager = CubeManager()
         self.active_connections: Set[WebSocket] = set()
         self.instance_id = str(uuid.uuid4())
+        self._msg_handlers = {
+            message_type: getattr(self, name)
+            for message_type, name in MESSAGE_HANDLERS.items()
+        }
+        # The UI is read on the first / request and cached; with
+        # reload_templates it is re-read on every request
+        self.reload_templates = reload_templates
+        self._index_html: Optional[str] = None
         self.setup_routes()
         
     def setup_middleware(self):
@@ -55,10 +92,13 @@ class StandaloneCubeServer:
         @self.app.get("/", response_class=HTMLResponse, tags=["UI"])
         async def get_html():
             """Get the HTML interface for the cube server"""
-            html_path = FilePath("sim/templates/standalone/cube_server.html")
-            with open(html_path) as f:
-                content = f.read()
-            return HTMLResponse(content)
+            if self._index_html is None or self.reload_templates:
+                try:
+                    self._index_html = await asyncio.to_thread(INDEX_HTML_PATH.read_text)
+                except OSError as e:
+                    logger.error(f"Error loading UI template: {str(e)}")
+                    raise HTTPException(status_code=500, detail="UI template not available")
+            return HTMLResponse(self._index_html)
             
         # WebSocket endpoint
         @self.app.websocket("/ws")
@@ -75,7 +115,7 @@ class StandaloneCubeServer:
                     "status": "active",
                     "instance_id": self.instance_id,
                     "connected_clients": len(self.active_connections),
-                    "timestamp": datetime.utcnow().isoformat()
+                    "timestamp": _ts()
                 }
             except Exception as e:
                 logger.error(f"Error getting status: {str(e)}")
@@ -94,7 +134,7 @@ class StandaloneCubeServer:
                 return {
                     "cube_id": result.cube_id,
                     "status": "created",
-                    "timestamp": datetime.utcnow().isoformat()
+                    "timestamp": _ts()
                 }
             except Exception as e:
                 logger.error(f"Error creating cube: {str(e)}")
@@ -125,7 +165,7 @@ class StandaloneCubeServer:
                     "type": message.message_type,
                     "cube_id": cube_id,
                     "data": message.data,
-                    "timestamp": datetime.utcnow().isoformat()
+                    "timestamp": _ts()
                 })
                 return {"status": "message_sent", "cube_id": cube_id}
             except Exception as e:
@@ -138,60 +178,80 @@ class StandaloneCubeServer:
         
         try:
             while True:
-                data = await websocket.receive_json()
+                data = await recv_fast(websocket)
                 await self.process_message(websocket, data)
         except Exception as e:
             logger.error(f"WebSocket error: {str(e)}")
         finally:
-            self.active_connections.remove(websocket)
+            self.active_connections.discard(websocket)
             
     async def process_message(self, websocket: WebSocket, data: Dict):
         try:
-            message_type = data.get("type")
-            if message_type == "create_cube":
-                result = await self.cube_manager.create_scada_cube(
-                    cube_id=data.get("cube_id"),
-                    name=data.get("name"),
-                    scada_type="standalone",
-                    configuration=data.get("config", {})
-                )
-                await websocket.send_json({
-                    "type": "cube_created",
-                    "cube_id": result.cube_id,
-                    "status": "success"
-                })
-            elif message_type == "list_cubes":
-                cubes = await self.cube_manager.list_cubes()
-                await websocket.send_json({
-                    "type": "cube_list",
-                    "cubes": cubes
-                })
-            elif message_type == "peer_discovery":
-                await self.handle_peer_discovery(websocket, data)
+            handler = self._msg_handlers.get(data.get("type"), self._unknown_message)
+            await handler(websocket, data)
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
-            await websocket.send_json({
+            await send_fast(websocket, {
                 "type": "error",
                 "message": str(e)
             })
             
+    async def handle_create_cube(self, websocket: WebSocket, data: Dict):
+        result = await self.cube_manager.create_scada_cube(
+            cube_id=data.get("cube_id"),
+            name=data.get("name"),
+            scada_type="standalone",
+            configuration=data.get("config", {})
+        )
+        await send_fast(websocket, {
+            "type": "cube_created",
+            "cube_id": result.cube_id,
+            "status": "success"
+        })
+        
+    async def handle_list_cubes(self, websocket: WebSocket, data: Dict):
+        cubes = await self.cube_manager.list_cubes()
+        await send_fast(websocket, {
+            "type": "cube_list",
+            "cubes": cubes
+        })
+        
+    async def _unknown_message(self, websocket: WebSocket, data: Dict):
+        logger.debug(f"Ignoring message of unknown type: {data.get('type')}")
+            
     async def handle_peer_discovery(self, websocket: WebSocket, data: Dict):
         peer_id = data.get("peer_id")
         if peer_id:
-            await websocket.send_json({
+            await send_fast(websocket, {
                 "type": "peer_ack",
                 "instance_id": self.instance_id
             })
 
+    async def _safe_send(self, connection: WebSocket, buf: bytes) -> bool:
+        """Send a pre-serialized frame, returning False instead of raising on failure."""
+        try:
+            await connection.send_bytes(buf)
+            return True
+        except Exception as e:
+            logger.error(f"Error broadcasting message: {str(e)}")
+            return False
+
     async def broadcast_message(self, message: Dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting message: {str(e)}")
+        # Serialize once for every client and send to all of them concurrently,
+        # so a slow client does not hold up the rest. Frames are binary JSON.
+        buf = orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS)
+        connections = tuple(self.active_connections)
+        results = await asyncio.gather(
+            *(self._safe_send(connection, buf) for connection in connections),
+            return_exceptions=True
+        )
+        # Drop connections that failed only after every send has finished
+        for connection, sent in zip(connections, results):
+            if sent is not True:
+                self.active_connections.discard(connection)
 
-def create_standalone_server():
-    server = StandaloneCubeServer()
+def create_standalone_server(reload_templates: bool = False):
+    server = StandaloneCubeServer(reload_templates=reload_templates)
     return server.app
 
 if __name__ == "__main__":